@@ -1,17 +1,40 @@
+import asyncio
+import json
 import os
-from typing import Literal, Any, Optional
-
-from fastapi import FastAPI, Request, HTTPException
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Any, List, Optional
+
+from fastapi import FastAPI, Request, Response, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from google.cloud import secretmanager
 
 from services.gemini import init_vertex, draft_itinerary_with_gemini
-from services.maps import enrich_with_maps, get_destination_hero_image, get_destination_photo_reference, get_fallback_destination_image
-from services.store import save_itinerary
+from services.maps import (
+    enrich_with_maps,
+    build_photo_url,
+    get_destination_photo_reference,
+    get_place_photo_reference,
+    get_fallback_destination_image,
+)
+from services.store import save_itinerary, list_itineraries, warm_client
+from services.pipeline import PlanPipeline
+from services.trip_index import TripIndex
+from services.media_cache import MediaCache, destination_key, place_key, places_photo_key
+from services.prefetch import Prefetcher
+from services.admission import AdmissionController, AdmissionRejected
+from services.cassette import Cassette, current_cassette, upstream, use_cassette
+from services.profiler import SamplingProfiler, active_profiler, profiling, verify_profile_token
+from services.jobs import JobRunner, JobQueueFull, TERMINAL_STATUSES, make_job_store
 
 # Proxy imports
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from urllib.parse import quote
 import httpx
 
@@ -27,6 +50,32 @@ REGION = os.environ.get("VERTEX_REGION", "asia-south1")
 
 MOOD_LABELS = {1: "chill", 2: "balanced", 3: "adventurous", 4: "party"}
 
+HERO_IMAGE_WIDTH = 1600
+PLACE_THUMB_WIDTH = int(os.getenv("PLANGENIE_PLACE_THUMB_WIDTH", "400"))
+PREFETCH_BLOCK_PHOTOS = os.getenv("PLANGENIE_PREFETCH_BLOCK_PHOTOS", "0") == "1"
+
+UPSTREAM_IMAGE_HEADERS = {
+    "User-Agent": DEFAULT_UA,
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+if DEFAULT_REFERER:
+    UPSTREAM_IMAGE_HEADERS["Referer"] = DEFAULT_REFERER
+
+# Previously generated trips, for instant previews and a better Gemini fallback
+trip_index = TripIndex()
+TRIP_INDEX_EXPORT = os.getenv("PLANGENIE_TRIP_INDEX_EXPORT")
+TRIP_INDEX_WARM = int(os.getenv("PLANGENIE_TRIP_INDEX_WARM", "0"))
+
+# Warm image cache shared by the /media proxy routes and the post-/plan prefetcher
+media_cache = MediaCache(max_bytes=int(os.getenv("PLANGENIE_MEDIA_CACHE_MB", "64")) * 1024 * 1024)
+prefetcher = Prefetcher(
+    media_cache,
+    workers=int(os.getenv("PLANGENIE_PREFETCH_WORKERS", "2")),
+    max_queue=int(os.getenv("PLANGENIE_PREFETCH_QUEUE", "64")),
+    byte_budget=int(os.getenv("PLANGENIE_PREFETCH_BUDGET_MB", "24")) * 1024 * 1024,
+    headers=UPSTREAM_IMAGE_HEADERS,
+)
+
 
 def access_secret(name: str) -> str:
     client = secretmanager.SecretManagerServiceClient()
@@ -73,7 +122,7 @@ class PlanRequest(BaseModel):
 
 
 @app.get("/")
-def root():
+async def root():
     return {"ok": True, "msg": "Planner API up. Use POST /plan"}
 
 
@@ -106,17 +155,169 @@ def boot():
 
     if MAPS_API_KEY_2:
         print("[boot] MAPS_API_KEY_2 loaded")
+        prefetcher.start()
     else:
         print("[boot] MAPS_API_KEY_2 is not configured")
 
+    job_runner.start()
+    threading.Thread(target=_warm_trip_index, name="trip-index-warm", daemon=True).start()
 
-@app.post("/plan")
-def plan(req: PlanRequest, request: Request):
+
+def _warm_trip_index():
+    # Off the boot path: an export file wins, else optionally read recent trips from Firestore
+    try:
+        if TRIP_INDEX_EXPORT:
+            count = trip_index.rebuild_from_export(TRIP_INDEX_EXPORT)
+            print(f"[trip_index] rebuilt from {TRIP_INDEX_EXPORT}: {count} trips")
+        elif TRIP_INDEX_WARM > 0 and PROJECT_ID:
+            count = trip_index.rebuild(reversed(list_itineraries(PROJECT_ID, TRIP_INDEX_WARM)))
+            print(f"[trip_index] warmed from Firestore: {count} trips")
+    except Exception as e:
+        print(f"[trip_index] warm-up failed: {e}")
+
+
+@app.on_event("shutdown")
+def teardown():
+    job_runner.shutdown()
+    prefetcher.shutdown()
+    PIPELINE_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+
+def schedule_prefetch(trip_id: str, city: str, days: list, owner: Optional[str] = None) -> None:
+    """
+    Queue image warm-up for a freshly generated trip: the hero image behind
+    imageUrl and, if enabled, thumbnails for enriched block place_ids.
+    With an `owner`, the trip's jobs are cancelled when that client starts its next /plan.
+    """
+    maps_key = MAPS_API_KEY_2
+    if not maps_key:
+        return
+    if owner:
+        prefetcher.assign(owner, trip_id)
+
+    hero_key = destination_key(city)
+    if media_cache.get_ref(hero_key):
+        prefetcher.submit(
+            trip_id,
+            hero_key,
+            lambda: _resolve_photo_url(hero_key, None, maps_key, HERO_IMAGE_WIDTH),
+        )
+
+    if not PREFETCH_BLOCK_PHOTOS:
+        return
+    for day in days:
+        for block in day.get("blocks", []):
+            place_id = block.get("place_id")
+            if not place_id:
+                continue
+            prefetcher.submit(
+                trip_id,
+                place_key(place_id, PLACE_THUMB_WIDTH),
+                lambda pid=place_id: _resolve_photo_url(
+                    f"place:{pid}", lambda: get_place_photo_reference(pid, maps_key), maps_key, PLACE_THUMB_WIDTH
+                ),
+            )
+
+
+def _resolve_photo_url(ref_key: str, lookup, maps_key: str, maxwidth: int) -> Optional[str]:
+    # Reuse a cached photo name when we have one; otherwise run the lookup and remember it
+    ref = media_cache.get_ref(ref_key)
+    if not ref and lookup:
+        ref = lookup()
+        if ref:
+            media_cache.put_ref(ref_key, ref)
+    return build_photo_url(ref, maps_key, maxwidth) if ref else None
+
+
+# Plans that can be in flight at once: synchronous /plan slots plus async job workers
+PLAN_CONCURRENCY = int(os.getenv("PLANGENIE_PLAN_CONCURRENCY", "8"))
+JOB_WORKERS = int(os.getenv("PLANGENIE_JOB_WORKERS", "2"))
+# Concurrent enrichment stages per plan; longer trips enrich several days per stage
+ENRICH_FANOUT = max(1, int(os.getenv("PLANGENIE_ENRICH_FANOUT", "3")))
+# Stages a single plan runs at once: hero lookup, Firestore warm-up, city hero lookup, enrichment
+PIPELINE_STAGES_PER_PLAN = 3 + ENRICH_FANOUT
+
+# Shared pool for /plan stages that can run alongside Gemini, sized so every in-flight
+# plan gets its stages started instead of queueing behind other plans' enrichment
+PIPELINE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(
+        os.getenv("PLANGENIE_PIPELINE_WORKERS", str((PLAN_CONCURRENCY + JOB_WORKERS) * PIPELINE_STAGES_PER_PLAN))
+    ),
+    thread_name_prefix="plan-stage",
+)
+
+
+def _lookup_hero_ref(query: str) -> Optional[str]:
+    return get_destination_photo_reference(query, MAPS_API_KEY_2) if MAPS_API_KEY_2 else None
+
+
+def _enrich_day(city: str, day: dict) -> dict:
+    try:
+        return enrich_with_maps(city, day, MAPS_API_KEY_2)
+    except Exception as e:
+        print(f"[maps_enrich] warning: {e}")
+        return day
+
+
+def _enrich_days(city: str, days: List[dict]) -> List[dict]:
+    return [_enrich_day(city, day) for day in days]
+
+
+def _same_place(a: str, b: str) -> bool:
+    return destination_key(a.split(",")[0]) == destination_key(b.split(",")[0])
+
+
+def run_plan(req: PlanRequest, pipeline: Optional[PlanPipeline] = None) -> dict:
+    """
+    The /plan pipeline, shared by the synchronous route and the async job workers.
+
+    Gemini drafting is the long pole, so work that only needs the request
+    (hero-photo lookup for the requested destination, Firestore client
+    warm-up) starts first and runs alongside it. Once the draft is in, days
+    are enriched concurrently and the hero lookup is reconciled with the
+    city Gemini actually chose.
+    """
+    if not PROJECT_ID:
+        raise RuntimeError("FIRESTORE_PROJECT env var is required")
+    pipeline = pipeline or PlanPipeline(PIPELINE_EXECUTOR)
+    try:
+        return _run_plan_stages(req, pipeline)
+    finally:
+        # Drop stages that haven't started (e.g. the hero lookup the similar-trip path doesn't use).
+        # Running ones only hold up the response while a capture is open, so they can't
+        # append to a cassette or profile after it has been saved.
+        pipeline.settle(wait_running=current_cassette() is not None or active_profiler() is not None)
+
+
+def _run_plan_stages(req: PlanRequest, pipeline: PlanPipeline) -> dict:
     prefs = req.model_dump()
     prefs["moodLabel"] = MOOD_LABELS.get(req.mood, "balanced")
 
+    # 0) Independent stages: only need the request
+    hero_future = pipeline.start("hero_lookup", _lookup_hero_ref, req.destination) if MAPS_API_KEY_2 else None
+    pipeline.start("firestore_warmup", warm_client, PROJECT_ID)
+
     # 1) Ask Gemini for a multi-day plan
-    draft = draft_itinerary_with_gemini(prefs)
+    with pipeline.stage("gemini"):
+        draft = draft_itinerary_with_gemini(prefs)
+
+    # Gemini failed: a similar stored trip (already enriched) beats the generic fallback
+    if draft.get("fallback"):
+        # Index contents are process state, so the lookup is recorded like an upstream call for replay
+        similar = upstream("trip_index", json.dumps(prefs, sort_keys=True), lambda: trip_index.preview(prefs))
+        if similar:
+            source_trip = similar.pop("similarTo")
+            print(f"[trip_index] using trip {source_trip} as fallback for {req.destination}")
+            itinerary = {
+                "prefs": prefs,
+                "itineraryDraft": similar,
+                "status": "DRAFT",
+                "source": "similar",
+                "similarTo": source_trip,
+            }
+            with pipeline.stage("firestore_save"):
+                trip_id = save_itinerary(PROJECT_ID, itinerary)
+            return {"tripId": trip_id, "draft": itinerary["itineraryDraft"]}
 
     city = draft.get("city") or req.destination
     days = draft.get("days") if isinstance(draft.get("days"), list) else []
@@ -136,11 +337,40 @@ def plan(req: PlanRequest, request: Request):
     if blurb:
         itinerary_draft["destinationBlurb"] = str(blurb).strip()[:140]
 
+    itinerary = {
+        "prefs": prefs,
+        "itineraryDraft": itinerary_draft,
+        "status": "DRAFT",
+        "source": "fallback" if draft.get("fallback") else "gemini",
+    }
+
+    # Reconcile the early hero lookup with Gemini's city. If they differ ("JAI" -> "Jaipur"),
+    # the resolved city is the better search term, so look it up alongside enrichment.
+    city_hero_future = None
+    if hero_future and not _same_place(city, req.destination):
+        city_hero_future = pipeline.start("hero_lookup_city", _lookup_hero_ref, city)
+
+    # 2) Enrich with Maps (server-side only), at most ENRICH_FANOUT stages per plan.
+    # Days are dealt round-robin (0,3,6 / 1,4,7 / ...) so the stages finish close together.
+    if MAPS_API_KEY_2:
+        fanout = min(ENRICH_FANOUT, len(days))
+        chunk_futures = [
+            pipeline.start(f"enrich_{j}", _enrich_days, city, days[j::fanout]) for j in range(fanout)
+        ]
+        enriched = list(days)
+        for j, future in enumerate(chunk_futures):
+            enriched[j::fanout] = future.result()
+        itinerary["itineraryDraft"]["days"] = enriched
+
     # Set image URL with better error handling and fallback options
     if MAPS_API_KEY_2:
-        # Test if we can get a photo reference for this destination
-        test_ref = get_destination_photo_reference(city, MAPS_API_KEY_2)
-        if test_ref:
+        hero_ref = city_hero_future.result() if city_hero_future else None
+        if not hero_ref:
+            # Same place, or nothing found for Gemini's city: the requested destination's photo still fits
+            hero_ref = hero_future.result()
+        if hero_ref:
+            # Keyed by city so /media/destination?q=<city> and the prefetcher reuse it
+            media_cache.put_ref(destination_key(city), hero_ref)
             itinerary_draft["imageUrl"] = f"/media/destination?q={quote(city)}"
             print(f"[hero_image] Google Places photo available for {city}")
         else:
@@ -149,25 +379,257 @@ def plan(req: PlanRequest, request: Request):
     else:
         print("[hero_image] MAPS_API_KEY_2 is not configured, no destination images available")
 
-    itinerary = {"prefs": prefs, "itineraryDraft": itinerary_draft, "status": "DRAFT"}
+    # 3) Store in Firestore (client already warmed up alongside Gemini)
+    with pipeline.stage("firestore_save"):
+        trip_id = save_itinerary(PROJECT_ID, itinerary)
+    if itinerary["source"] == "gemini":
+        trip_index.add(trip_id, itinerary)
+    return {"tripId": trip_id, "draft": itinerary["itineraryDraft"]}
 
-    # 2) Enrich with Maps (server-side only)
-    if MAPS_API_KEY_2:
-        enriched_days = []
-        for day in itinerary["itineraryDraft"]["days"]:
+
+# --- Profiling / upstream capture ---
+PROFILE_SECRET = os.getenv("PLANGENIE_PROFILE_SECRET", "")
+PROFILE_ADMIN = os.getenv("PLANGENIE_PROFILE_ADMIN", "0") == "1"
+PROFILE_DIR = os.getenv("PLANGENIE_PROFILE_DIR", "/tmp/plangenie-profiles")
+# "record" captures a replayable cassette for every /plan, not just profiled ones
+CASSETTE_MODE = os.getenv("PLANGENIE_CASSETTE_MODE", "off")
+# Fraction of /plan requests recorded in "record" mode (profiled requests are always captured)
+CASSETTE_SAMPLE_RATE = float(os.getenv("PLANGENIE_CASSETTE_SAMPLE_RATE", "0.05"))
+# Captures kept on disk; /tmp is memory-backed on Cloud Run, so older ones are pruned on write
+PROFILE_MAX_CAPTURES = int(os.getenv("PLANGENIE_PROFILE_MAX_CAPTURES", "50"))
+CAPTURE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+CAPTURE_FILES = {"summary": "summary.txt", "collapsed": "collapsed.txt", "cassette": "cassette.json"}
+
+
+def _should_record() -> bool:
+    return CASSETTE_MODE == "record" and random.random() < CASSETTE_SAMPLE_RATE
+
+
+def _prune_captures() -> None:
+    """Keep only the newest PROFILE_MAX_CAPTURES captures (all files of a capture go together)."""
+    captures: dict = {}
+    for name in os.listdir(PROFILE_DIR):
+        capture_id = name.split(".", 1)[0]
+        if not CAPTURE_ID_RE.match(capture_id):
+            continue
+        try:
+            mtime = os.path.getmtime(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            continue  # pruned concurrently by another request
+        captures[capture_id] = max(captures.get(capture_id, 0.0), mtime)
+    stale = sorted(captures, key=captures.get, reverse=True)[PROFILE_MAX_CAPTURES:]
+    for capture_id in stale:
+        for suffix in CAPTURE_FILES.values():
             try:
-                enriched_days.append(enrich_with_maps(city, day, MAPS_API_KEY_2))
-            except Exception as e:
-                print(f"[maps_enrich] warning: {e}")
-                enriched_days.append(day)
-        itinerary["itineraryDraft"]["days"] = enriched_days
+                os.remove(os.path.join(PROFILE_DIR, f"{capture_id}.{suffix}"))
+            except FileNotFoundError:
+                pass
+
+
+def _profile_authorized(request: Request) -> bool:
+    """Signed X-PlanGenie-Profile header, or any value when the admin flag is on."""
+    token = request.headers.get("x-plangenie-profile")
+    if not token:
+        return False
+    return PROFILE_ADMIN or verify_profile_token(token, PROFILE_SECRET)
+
+
+def run_plan_captured(
+    req: PlanRequest, capture_id: str, profile: bool = False, pipeline: Optional[PlanPipeline] = None
+) -> dict:
+    """
+    run_plan with every Gemini/Places/Firestore call recorded to a cassette
+    and, if requested, a sampling profile of the pipeline. Artifacts are
+    written to PROFILE_DIR as <capture_id>.*.
+    """
+    cassette = Cassette(
+        "record",
+        meta={
+            "captureId": capture_id,
+            "project": PROJECT_ID,
+            "mapsConfigured": bool(MAPS_API_KEY_2),
+            "request": req.model_dump(),
+        },
+    )
+    profiler = SamplingProfiler() if profile else None
+    pipeline = pipeline or PlanPipeline(PIPELINE_EXECUTOR)
+    started = time.perf_counter()
+    try:
+        with use_cassette(cassette), profiling(profiler):
+            return run_plan(req, pipeline)
+    finally:
+        cassette.meta["wallSeconds"] = round(time.perf_counter() - started, 4)
+        cassette.meta["upstreamSeconds"] = cassette.upstream_seconds()
+        cassette.meta["stages"] = pipeline.report()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            cassette.save(os.path.join(PROFILE_DIR, f"{capture_id}.{CAPTURE_FILES['cassette']}"))
+            if profiler:
+                for kind, text in (("summary", profiler.summary()), ("collapsed", profiler.collapsed())):
+                    with open(os.path.join(PROFILE_DIR, f"{capture_id}.{CAPTURE_FILES[kind]}"), "w") as f:
+                        f.write(text)
+            _prune_captures()
+            print(f"[profile] captured {capture_id} wall={cassette.meta['wallSeconds']}s upstream={cassette.meta['upstreamSeconds']}")
+        except Exception as e:
+            print(f"[profile] could not store capture {capture_id}: {e}")
 
-    if not PROJECT_ID:
-        raise RuntimeError("FIRESTORE_PROJECT env var is required")
 
-    # 3) Store in Firestore
-    trip_id = save_itinerary(PROJECT_ID, itinerary)
-    return {"tripId": trip_id, "draft": itinerary["itineraryDraft"]}
+def _run_plan_job(payload: dict) -> dict:
+    req = PlanRequest(**payload)
+    pipeline = PlanPipeline(PIPELINE_EXECUTOR)
+    if _should_record():
+        capture_id = uuid.uuid4().hex
+        result = run_plan_captured(req, capture_id, pipeline=pipeline)
+        # Surfaced through the job's result so callers can fetch it from /debug/captures
+        result["captureId"] = capture_id
+    else:
+        result = run_plan(req, pipeline)
+    print(f"[pipeline] job stages {pipeline.report()}")
+    schedule_prefetch(result["tripId"], result["draft"]["city"], result["draft"]["days"])
+    return result
+
+
+job_runner = JobRunner(
+    make_job_store(
+        os.getenv("PLANGENIE_JOB_STORE", "memory"),
+        os.getenv("PLANGENIE_JOB_DB", "/tmp/plangenie-jobs.sqlite3"),
+    ),
+    _run_plan_job,
+    workers=JOB_WORKERS,
+    max_queue=int(os.getenv("PLANGENIE_JOB_QUEUE", "32")),
+    max_per_owner=int(os.getenv("PLANGENIE_JOB_QUEUE_PER_CLIENT", "4")),
+)
+JOB_MAX_WAIT_SECONDS = 30.0
+JOB_POLL_INTERVAL_SECONDS = 0.5
+
+
+def _job_view(job: dict) -> dict:
+    view = {"jobId": job["id"], "status": job["status"], "createdAt": job["createdAt"], "updatedAt": job["updatedAt"]}
+    if job.get("result") is not None:
+        view["result"] = job["result"]
+    if job.get("error"):
+        view["error"] = job["error"]
+    return view
+
+
+# Admission control in front of the synchronous /plan pipeline
+admission = AdmissionController(
+    max_concurrent=PLAN_CONCURRENCY,
+    max_queue=int(os.getenv("PLANGENIE_PLAN_QUEUE", "32")),
+    max_wait=float(os.getenv("PLANGENIE_PLAN_MAX_WAIT", "10")),
+    max_queued_per_client=int(os.getenv("PLANGENIE_PLAN_QUEUE_PER_CLIENT", "4")),
+)
+
+
+# Proxies in front of us that append to X-Forwarded-For (Cloud Run's front end counts as one)
+TRUSTED_PROXY_HOPS = int(os.getenv("PLANGENIE_TRUSTED_PROXY_HOPS", "1"))
+
+
+def _client_id(request: Request) -> str:
+    """
+    Fair-share key: the client IP as seen by our trusted proxies. Only hops
+    those proxies appended (counted from the right) are used; anything to the
+    left is caller-supplied and could be forged to dodge per-client limits.
+    The API has no verified auth identity yet, so Authorization is ignored.
+    """
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if TRUSTED_PROXY_HOPS > 0 and len(forwarded) >= TRUSTED_PROXY_HOPS:
+        return "ip:" + forwarded[-TRUSTED_PROXY_HOPS]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+@app.post("/plan")
+async def plan(
+    req: PlanRequest,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    async_mode: bool = Query(False, alias="async"),
+):
+    client_id = _client_id(request)
+
+    if async_mode:
+        # Job mode: hand the pipeline to the worker pool and return immediately.
+        # Jobs are capped per client, like queued synchronous requests.
+        # Both touch locks/SQLite or deep-copy drafts, so keep them off the event loop
+        try:
+            job = await run_in_threadpool(job_runner.submit, req.model_dump(), client_id)
+        except JobQueueFull as e:
+            print(f"[jobs] shed /plan?async=1 for {client_id}: {e.reason}")
+            raise HTTPException(
+                status_code=503,
+                detail=e.reason,
+                headers={"Retry-After": str(job_runner.retry_after())},
+            )
+        body = _job_view(job)
+        # Instant preview from a similar past trip while the fresh plan is generated
+        preview = await run_in_threadpool(trip_index.preview, req.model_dump())
+        if preview:
+            body["preview"] = preview
+        return JSONResponse(
+            status_code=202,
+            content=body,
+            headers={"Location": f"/plan/jobs/{job['id']}"},
+        )
+
+    profile = _profile_authorized(request)
+    capture_id = uuid.uuid4().hex if profile or _should_record() else None
+
+    try:
+        async with admission.slot(client_id):
+            # Created once admitted, so queueing for a slot isn't reported as pipeline time
+            pipeline = PlanPipeline(PIPELINE_EXECUTOR)
+            if capture_id:
+                result = await run_in_threadpool(run_plan_captured, req, capture_id, profile, pipeline)
+            else:
+                result = await run_in_threadpool(run_plan, req, pipeline)
+    except AdmissionRejected as e:
+        print(f"[admission] shed /plan: {e.reason} {admission.stats()}")
+        raise HTTPException(status_code=503, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+    if capture_id:
+        response.headers["X-Capture-Id"] = capture_id
+    # Per-stage timings and how much of them overlapped, visible in browser devtools
+    response.headers["Server-Timing"] = pipeline.server_timing()
+    print(f"[pipeline] stages {pipeline.report()}")
+
+    # The new trip supersedes this client's previous one: stop warming its images
+    # (only now, so a shed or failed /plan leaves the current trip's warm-up alone)
+    prefetcher.cancel_owner(client_id)
+    # Warm the image cache once the response has been sent
+    background_tasks.add_task(
+        schedule_prefetch, result["tripId"], result["draft"]["city"], result["draft"]["days"], client_id
+    )
+    return result
+
+
+@app.get("/plan/jobs/{job_id}")
+async def plan_job(job_id: str, wait: float = 0):
+    """
+    Job status/result. With `wait` (seconds, capped at 30) this long-polls
+    until the job finishes or the wait elapses.
+    """
+    deadline = time.monotonic() + min(max(wait, 0.0), JOB_MAX_WAIT_SECONDS)
+    while True:
+        job = await run_in_threadpool(job_runner.store.get, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in TERMINAL_STATUSES or time.monotonic() >= deadline:
+            return _job_view(job)
+        await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+
+@app.get("/debug/captures/{capture_id}")
+def debug_capture(capture_id: str, request: Request, kind: Literal["summary", "collapsed", "cassette"] = "summary"):
+    """Stored profile/cassette for a captured /plan; needs the same header as profiling."""
+    if not _profile_authorized(request):
+        raise HTTPException(status_code=403, detail="Profiling not authorized")
+    if not CAPTURE_ID_RE.match(capture_id):
+        raise HTTPException(status_code=404, detail="Capture not found")
+    path = os.path.join(PROFILE_DIR, f"{capture_id}.{CAPTURE_FILES[kind]}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Capture not found")
+    media_type = "application/json" if kind == "cassette" else "text/plain"
+    return FileResponse(path, media_type=media_type)
 
 # testsearch debugging
 from services.maps import textsearch_raw
@@ -194,29 +656,40 @@ def debug_photoref(q: str, maxwidth: int = 1200):
         "proxy_url": f"/media/places-photo?ref={quote(ref)}&mw={maxwidth}" if ref else None,
     }
 
+def _cached_image_response(content: bytes, content_type: str, cache_status: str, source: Optional[str] = None):
+    headers = {"Cache-Control": "public, max-age=86400", "X-Cache": cache_status}
+    if source:
+        headers["X-Image-Source"] = source
+    return StreamingResponse(iter([content]), media_type=content_type, headers=headers)
+
+
 # --- Proxy route: Places Photo only (uses MAPS_API_KEY_2) ---
 @app.get("/media/destination")
 async def destination_image(q: str):
     if not MAPS_API_KEY_2:
         raise HTTPException(status_code=503, detail="Maps API key not configured")
 
-    # Build a Places Photo URL server-side (legacy flow) so the key never hits the browser
-    url = get_destination_hero_image(q, MAPS_API_KEY_2)
-    if not url:
+    cache_key = destination_key(q)
+    cached = media_cache.get(cache_key)
+    if cached:
+        return _cached_image_response(cached[0], cached[1], "HIT", "google-places")
+
+    # Build a Places Photo URL server-side (legacy flow) so the key never hits the browser.
+    # /plan already resolved the photo name for its own city, so reuse it when present.
+    photo_name = media_cache.get_ref(cache_key)
+    if not photo_name:
+        photo_name = await run_in_threadpool(get_destination_photo_reference, q, MAPS_API_KEY_2)
+        if photo_name:
+            media_cache.put_ref(cache_key, photo_name)
+    if not photo_name:
         # No Places Photo found — return 404 so frontend can use fallback
         print(f"[media_proxy] No image found for destination: {q}")
         raise HTTPException(status_code=404, detail="No image found for destination")
-
-    upstream_headers = {
-        "User-Agent": DEFAULT_UA,
-        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-    }
-    if DEFAULT_REFERER:
-        upstream_headers["Referer"] = DEFAULT_REFERER
+    url = build_photo_url(photo_name, MAPS_API_KEY_2, HERO_IMAGE_WIDTH)
 
     try:
         async with httpx.AsyncClient(
-            timeout=20.0, follow_redirects=True, headers=upstream_headers
+            timeout=20.0, follow_redirects=True, headers=UPSTREAM_IMAGE_HEADERS
         ) as client:
             r = await client.get(url)
             if r.status_code != 200:
@@ -231,25 +704,57 @@ async def destination_image(q: str):
                 print(f"[media_proxy] unexpected content-type: {content_type}")
                 raise HTTPException(status_code=502, detail="Invalid image response")
 
-            return StreamingResponse(
-                iter([r.content]),
-                media_type=content_type,
-                headers={
-                    "Cache-Control": "public, max-age=86400",
-                    "X-Image-Source": "google-places"
-                },
-            )
+            media_cache.put(cache_key, r.content, content_type)
+            return _cached_image_response(r.content, content_type, "MISS", "google-places")
     except HTTPException:
         raise
     except Exception as e:
         print(f"[media_proxy] error for destination {q}: {e}")
         raise HTTPException(status_code=502, detail="Image proxy error")
 
+@app.get("/media/place")
+async def place_image(id: str, mw: int = PLACE_THUMB_WIDTH):
+    """Thumbnail for an enriched block's place_id (warmed by the post-/plan prefetch)."""
+    if not MAPS_API_KEY_2:
+        raise HTTPException(status_code=503, detail="Maps API key not configured")
+
+    cache_key = place_key(id, mw)
+    cached = media_cache.get(cache_key)
+    if cached:
+        return _cached_image_response(cached[0], cached[1], "HIT", "google-places")
+
+    url = await run_in_threadpool(
+        _resolve_photo_url, f"place:{id}", lambda: get_place_photo_reference(id, MAPS_API_KEY_2), MAPS_API_KEY_2, mw
+    )
+    if not url:
+        raise HTTPException(status_code=404, detail="No image found for place")
+
+    try:
+        async with httpx.AsyncClient(timeout=20.0, follow_redirects=True, headers=UPSTREAM_IMAGE_HEADERS) as client:
+            r = await client.get(url)
+            content_type = r.headers.get("content-type", "image/jpeg")
+            if r.status_code != 200 or not content_type.startswith("image/"):
+                print(f"[place_proxy] status={r.status_code} content-type={content_type}")
+                raise HTTPException(status_code=404, detail=f"Upstream {r.status_code}")
+
+            media_cache.put(cache_key, r.content, content_type)
+            return _cached_image_response(r.content, content_type, "MISS", "google-places")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[place_proxy] error for place {id}: {e}")
+        raise HTTPException(status_code=502, detail="Image proxy error")
+
 @app.get("/media/places-photo")
 async def places_photo(ref: str, mw: int = 1200):
     if not MAPS_API_KEY_2:
         raise HTTPException(status_code=404, detail="Maps key not configured")
 
+    cache_key = places_photo_key(ref, mw)
+    cached = media_cache.get(cache_key)
+    if cached:
+        return _cached_image_response(cached[0], cached[1], "HIT")
+
     # New Places API endpoint format
     # ref should be in format: places/{place_id}/photos/{photo_reference}
     if "/photos/" in ref:
@@ -260,26 +765,17 @@ async def places_photo(ref: str, mw: int = 1200):
 
     params = {"maxWidthPx": str(mw), "key": MAPS_API_KEY_2}
 
-    headers = {
-        "User-Agent": DEFAULT_UA,
-        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-    }
-    if DEFAULT_REFERER:
-        headers["Referer"] = DEFAULT_REFERER  # only if your key requires it
-
     try:
-        async with httpx.AsyncClient(timeout=20.0, follow_redirects=True, headers=headers) as client:
+        async with httpx.AsyncClient(timeout=20.0, follow_redirects=True, headers=UPSTREAM_IMAGE_HEADERS) as client:
             r = await client.get(url, params=params)
             if r.status_code != 200:
                 snippet = r.text[:300] if r.text else str(r.content[:300])
                 print(f"[places_photo_proxy] status={r.status_code} body={snippet}")
                 raise HTTPException(status_code=404, detail=f"Upstream {r.status_code}")
 
-            return StreamingResponse(
-                iter([r.content]),
-                media_type=r.headers.get("content-type", "image/jpeg"),
-                headers={"Cache-Control": "public, max-age=86400"},
-            )
+            content_type = r.headers.get("content-type", "image/jpeg")
+            media_cache.put(cache_key, r.content, content_type)
+            return _cached_image_response(r.content, content_type, "MISS")
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,64 @@
+"""
+Replay a captured /plan offline against its recorded Gemini/Places/Firestore
+responses, e.g. to profile a slow production request or as a regression
+benchmark.
+
+    python replay.py /tmp/plangenie-profiles/<capture_id>.cassette.json --repeat 5 --profile
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from services.cassette import Cassette, use_cassette
+from services.profiler import SamplingProfiler, profiling
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="Replay a captured /plan request offline")
+    parser.add_argument("cassette", help="path to a <capture_id>.cassette.json file")
+    parser.add_argument("--repeat", type=int, default=1, help="number of replays (reports min/median)")
+    parser.add_argument("--no-timing", action="store_true", help="answer upstream calls instantly (CPU time only)")
+    parser.add_argument("--profile", action="store_true", help="sample the last replay and print the hottest frames")
+    parser.add_argument("--collapsed", help="write collapsed stacks of the profiled replay to this file")
+    args = parser.parse_args()
+
+    with open(args.cassette, encoding="utf-8") as f:
+        meta = json.load(f).get("meta") or {}
+
+    # main reads its config at import time; nothing below talks to GCP
+    os.environ.setdefault("FIRESTORE_PROJECT", meta.get("project") or "replay")
+    import main as api
+
+    if meta.get("mapsConfigured"):
+        api.MAPS_API_KEY_2 = "replay"  # never sent: Places calls are answered from the cassette
+    req = api.PlanRequest(**meta["request"])
+
+    timings = []
+    profiler = None
+    for i in range(max(1, args.repeat)):
+        cassette = Cassette.load(args.cassette, replay_timing=not args.no_timing)
+        profiler = SamplingProfiler() if args.profile and i == args.repeat - 1 else None
+        started = time.perf_counter()
+        with use_cassette(cassette), profiling(profiler):
+            api.run_plan(req)
+        timings.append(time.perf_counter() - started)
+        if cassette.misses:
+            # The pipeline swallows most upstream errors, so a diverged replay would otherwise look fine
+            raise SystemExit(
+                f"[replay] {len(cassette.misses)} call(s) not in the cassette; this replay took a different path"
+                " than the recorded request:\n  " + "\n  ".join(cassette.misses)
+            )
+
+    print(f"[replay] recorded wall={meta.get('wallSeconds')}s upstream={meta.get('upstreamSeconds')}")
+    print(f"[replay] runs={len(timings)} min={min(timings):.4f}s median={statistics.median(timings):.4f}s")
+    if profiler:
+        print(profiler.summary())
+        if args.collapsed:
+            with open(args.collapsed, "w") as f:
+                f.write(profiler.collapsed())
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,124 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Concurrency limiter for the /plan pipeline, used from the event loop.
+
+    - At most `max_concurrent` requests run at once; the rest wait in a
+      bounded queue (`max_queue` overall, `max_queued_per_client` each) for
+      up to `max_wait` seconds.
+    - Freed slots are handed to waiting clients round-robin so one noisy
+      client cannot starve the others.
+    - Requests that cannot be queued are rejected immediately with a
+      Retry-After estimate derived from recent service times.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 8,
+        max_queue: int = 32,
+        max_wait: float = 10.0,
+        max_queued_per_client: int = 4,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.max_queued_per_client = max(1, max_queued_per_client)
+        self._active = 0
+        self._queued = 0
+        # client -> waiting futures; client order is the round-robin order
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._avg_service_seconds = 10.0
+
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        await self.acquire(client_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record_service_time(time.monotonic() - started)
+            self.release()
+
+    async def acquire(self, client_id: str) -> None:
+        if self._active < self.max_concurrent and not self._queued:
+            self._active += 1
+            return
+
+        if self._queued >= self.max_queue:
+            raise AdmissionRejected("Plan queue is full", self.retry_after())
+        waiting = self._waiters.get(client_id)
+        if waiting is not None and len(waiting) >= self.max_queued_per_client:
+            raise AdmissionRejected("Too many queued plans for this client", self.retry_after())
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client_id, deque()).append(fut)
+        self._queued += 1
+        try:
+            await asyncio.wait_for(fut, timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                self._forget(client_id, fut)
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("Timed out waiting for a plan slot", self.retry_after())
+            raise
+
+    def release(self) -> None:
+        # Hand the slot straight to the next waiting client instead of freeing it
+        while self._waiters:
+            client_id, waiting = next(iter(self._waiters.items()))
+            fut = waiting.popleft()
+            self._queued -= 1
+            if waiting:
+                self._waiters.move_to_end(client_id)
+            else:
+                del self._waiters[client_id]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    def retry_after(self) -> int:
+        backlog = self._queued + 1
+        estimate = self._avg_service_seconds * backlog / self.max_concurrent
+        return max(1, min(60, math.ceil(estimate)))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "clients": len(self._waiters),
+            "maxConcurrent": self.max_concurrent,
+            "maxQueue": self.max_queue,
+        }
+
+    def _forget(self, client_id: str, fut: asyncio.Future) -> None:
+        waiting = self._waiters.get(client_id)
+        if waiting is None or fut not in waiting:
+            return
+        waiting.remove(fut)
+        self._queued -= 1
+        if not waiting:
+            del self._waiters[client_id]
+
+    def _record_service_time(self, seconds: float) -> None:
+        # Exponentially weighted so Retry-After tracks current upstream latency
+        self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * seconds
@@ -0,0 +1,126 @@
+import contextvars
+import copy
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Cassette active for the current request/thread (None = talk to upstreams normally)
+_current: "contextvars.ContextVar[Optional[Cassette]]" = contextvars.ContextVar("plangenie_cassette", default=None)
+
+
+class CassetteMiss(RuntimeError):
+    """Replay asked for an upstream call the cassette never recorded."""
+
+
+class ReplayedUpstreamError(RuntimeError):
+    """Re-raised in replay where the recorded upstream call failed."""
+
+
+class Cassette:
+    """
+    Ordered log of upstream calls (Gemini, Places, Firestore) for one /plan.
+
+    In "record" mode every wrapped call is executed and its JSON-able result
+    (or error) is stored with its latency. In "replay" mode calls are answered
+    from the log, matched by (kind, key) in recorded order, and optionally
+    sleep for the recorded latency so timings match the original request.
+    Replay misses are collected in `misses` as well as raised, since callers
+    often swallow upstream errors and would otherwise hide a diverged replay.
+    """
+
+    def __init__(self, mode: str, meta: Optional[Dict] = None, interactions: Optional[List[Dict]] = None,
+                 replay_timing: bool = True):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"unknown cassette mode {mode!r}")
+        self.mode = mode
+        self.meta = meta or {}
+        self.interactions: List[Dict] = interactions or []
+        self.replay_timing = replay_timing
+        self.misses: List[str] = []
+        self._lock = threading.Lock()
+        self._replay_queues: Dict[Tuple[str, str], Deque[Dict]] = defaultdict(deque)
+        for interaction in self.interactions:
+            self._replay_queues[(interaction["kind"], interaction["key"])].append(interaction)
+
+    def call(self, kind: str, key: str, fn: Callable[[], Any]) -> Any:
+        if self.mode == "replay":
+            return self._replay(kind, key)
+
+        started = time.perf_counter()
+        entry: Dict[str, Any] = {"kind": kind, "key": key, "offset": started}
+        try:
+            result = fn()
+            # Snapshot it: callers go on to mutate responses (e.g. enriching days in place)
+            entry["response"] = copy.deepcopy(result)
+            return result
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            entry["elapsed"] = round(time.perf_counter() - started, 6)
+            with self._lock:
+                self.interactions.append(entry)
+
+    def _replay(self, kind: str, key: str) -> Any:
+        with self._lock:
+            queue = self._replay_queues.get((kind, key))
+            if not queue:
+                miss = f"no recorded {kind} call for key {key[:120]!r}"
+                self.misses.append(miss)
+                raise CassetteMiss(miss)
+            entry = queue.popleft()
+        if self.replay_timing:
+            time.sleep(entry.get("elapsed", 0))
+        if "error" in entry:
+            raise ReplayedUpstreamError(entry["error"])
+        return copy.deepcopy(entry.get("response"))
+
+    def upstream_seconds(self) -> Dict[str, float]:
+        totals: Dict[str, float] = defaultdict(float)
+        for entry in self.interactions:
+            totals[entry["kind"]] += entry.get("elapsed", 0)
+        return {k: round(v, 4) for k, v in totals.items()}
+
+    def to_dict(self) -> Dict:
+        # Offsets are stored relative to the first call so cassettes are comparable
+        base = min((e["offset"] for e in self.interactions if "offset" in e), default=0)
+        interactions = [dict(e, offset=round(e.get("offset", base) - base, 6)) for e in self.interactions]
+        return {"version": 1, "meta": self.meta, "interactions": interactions}
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1, default=str)
+
+    @classmethod
+    def load(cls, path: str, replay_timing: bool = True) -> "Cassette":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls("replay", data.get("meta"), data.get("interactions"), replay_timing=replay_timing)
+
+
+@contextmanager
+def use_cassette(cassette: Optional[Cassette]):
+    token = _current.set(cassette)
+    try:
+        yield cassette
+    finally:
+        _current.reset(token)
+
+
+def current_cassette() -> Optional[Cassette]:
+    return _current.get()
+
+
+def upstream(kind: str, key: str, fn: Callable[[], Any]) -> Any:
+    """
+    Run an upstream call through the active cassette, if any. `fn` must return
+    something JSON-serializable so it can be recorded. Keys must not contain
+    API keys or other secrets.
+    """
+    cassette = _current.get()
+    if cassette is None:
+        return fn()
+    return cassette.call(kind, key, fn)
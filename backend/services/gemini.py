@@ -1,3 +1,4 @@
+import hashlib
 import json
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Optional
@@ -5,6 +6,10 @@ from typing import Dict, List, Optional
 import vertexai
 from vertexai.generative_models import GenerativeModel
 
+from services.cassette import upstream
+
+GEMINI_MODEL = "gemini-1.5-flash"
+
 
 def init_vertex(project_id: str, region: str):
     vertexai.init(project=project_id, location=region)
@@ -17,7 +22,6 @@ def draft_itinerary_with_gemini(prefs: Dict) -> Dict:
     that is derived from the itinerary (not just echoing user input), and
     includes a one-line destination_blurb.
     """
-    model = GenerativeModel("gemini-1.5-flash")
     mood_label = prefs.get("moodLabel", "balanced")
 
     # Prompt keeps your existing structure, adds clear budgeting + blurb instruction.
@@ -58,8 +62,12 @@ def draft_itinerary_with_gemini(prefs: Dict) -> Dict:
     """
 
     try:
-        resp = model.generate_content(prompt)
-        text = (resp.text or "").strip().strip("`")
+        text = upstream(
+            "gemini",
+            f"{GEMINI_MODEL} {hashlib.sha256(prompt.encode()).hexdigest()}",
+            lambda: GenerativeModel(GEMINI_MODEL).generate_content(prompt).text,
+        )
+        text = (text or "").strip().strip("`")
         if "{" not in text or "}" not in text:
             raise ValueError("Gemini response did not contain JSON")
         payload = text[text.find("{"): text.rfind("}") + 1]
@@ -214,6 +222,8 @@ def _fallback_itinerary(prefs: Dict) -> Dict:
         "city": destination,
         "days": _fallback_days(prefs, destination),
         "destination_blurb": f"Discover {destination}'s highlights with a smart mix of sights, food, and local culture.",
+        # Lets callers swap in a better fallback (e.g. a similar stored trip)
+        "fallback": True,
     }
     itin["total_budget"] = _estimate_total_budget_from_blocks(itin, prefs)
     return itin
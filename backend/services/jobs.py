@@ -0,0 +1,306 @@
+import json
+import math
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# Job lifecycle: queued -> running -> done | error
+TERMINAL_STATUSES = ("done", "error")
+
+
+class JobQueueFull(Exception):
+    """Raised when the worker pool's bounded queue, or a client's share of it, cannot accept another job."""
+
+    def __init__(self, reason: str = "Plan job queue is full, retry later"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+# ---------------------------
+# Job stores
+# ---------------------------
+class JobStore(ABC):
+    """
+    Minimal persistence interface for plan jobs. A job is a plain dict with
+    id, status, payload, result, error, createdAt and updatedAt.
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, payload: Dict) -> Dict:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> None:
+        ...
+
+    @abstractmethod
+    def list_unfinished(self) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    def delete(self, job_id: str) -> None:
+        ...
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local store; jobs are lost when the worker restarts."""
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+
+    def create(self, job_id: str, payload: Dict) -> Dict:
+        now = _now()
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune()
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+                job["updatedAt"] = _now()
+
+    def list_unfinished(self) -> List[Dict]:
+        with self._lock:
+            return [dict(j) for j in self._jobs.values() if j["status"] not in TERMINAL_STATUSES]
+
+    def delete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self) -> None:
+        # Caller holds the lock; drop the oldest finished jobs first (dicts keep insertion order)
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [k for k, j in self._jobs.items() if j["status"] in TERMINAL_STATUSES]:
+            del self._jobs[job_id]
+            if len(self._jobs) <= self.max_jobs:
+                return
+
+
+class SqliteJobStore(JobStore):
+    """Durable local store so queued/running jobs survive a worker restart."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS plan_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    createdAt TEXT NOT NULL,
+                    updatedAt TEXT NOT NULL
+                )
+                """
+            )
+
+    def create(self, job_id: str, payload: Dict) -> Dict:
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO plan_jobs (id, status, payload, createdAt, updatedAt) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(payload), now, now),
+            )
+        return self.get(job_id)  # type: ignore[return-value]
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM plan_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        if not fields:
+            return
+        fields["updatedAt"] = _now()
+        for name in ("payload", "result"):
+            if name in fields and fields[name] is not None:
+                fields[name] = json.dumps(fields[name])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE plan_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def list_unfinished(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM plan_jobs WHERE status NOT IN (?, ?) ORDER BY createdAt", TERMINAL_STATUSES
+            ).fetchall()
+        return [self._row_to_job(r) for r in rows]
+
+    def delete(self, job_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM plan_jobs WHERE id = ?", (job_id,))
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        return job
+
+
+def make_job_store(kind: str, path: str) -> JobStore:
+    if kind == "sqlite":
+        return SqliteJobStore(path)
+    if kind != "memory":
+        print(f"[jobs] unknown job store {kind!r}, using memory")
+    return InMemoryJobStore()
+
+
+# ---------------------------
+# Worker pool
+# ---------------------------
+class JobRunner:
+    """
+    Fixed-size worker pool draining a bounded queue of job ids. `handler`
+    receives the job payload and returns a JSON-serializable result.
+    `max_per_owner` caps the queued + running jobs of one owner (client) so a
+    single caller can't take every queue slot; 0 disables the cap.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[Dict], Dict],
+        workers: int = 2,
+        max_queue: int = 32,
+        max_per_owner: int = 0,
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_per_owner = max_per_owner
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max_queue)
+        self._threads: List[threading.Thread] = []
+        self._avg_job_seconds = 10.0
+        self._lock = threading.Lock()
+        # job id -> owner, and owner -> queued + running jobs
+        self._job_owners: Dict[str, str] = {}
+        self._owner_counts: Dict[str, int] = {}
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up, from recent job durations."""
+        backlog = self._queue.qsize() + 1
+        estimate = self._avg_job_seconds * backlog / self.workers
+        return max(1, min(60, math.ceil(estimate)))
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        # Pick up work left behind by a previous process (durable stores only)
+        for job in self.store.list_unfinished():
+            try:
+                self._queue.put_nowait(job["id"])
+                self.store.update(job["id"], status="queued")
+            except queue.Full:
+                self.store.update(job["id"], status="error", error="Job could not be resumed after restart")
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"plan-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[jobs] started {self.workers} workers")
+
+    def shutdown(self) -> None:
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        self._threads = []
+
+    def submit(self, payload: Dict, owner: Optional[str] = None) -> Dict:
+        if self._queue.full():
+            raise JobQueueFull()
+        job_id = uuid.uuid4().hex
+        if owner:
+            self._claim(job_id, owner)
+        try:
+            job = self.store.create(job_id, payload)
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                # Lost the race for the last slot: the job never existed as far as callers know
+                self.store.delete(job_id)
+                raise JobQueueFull()
+        except Exception:
+            self._release(job_id)
+            raise
+        return job
+
+    def _claim(self, job_id: str, owner: str) -> None:
+        with self._lock:
+            count = self._owner_counts.get(owner, 0)
+            if self.max_per_owner and count >= self.max_per_owner:
+                raise JobQueueFull("Too many plan jobs queued for this client")
+            self._owner_counts[owner] = count + 1
+            self._job_owners[job_id] = owner
+
+    def _release(self, job_id: str) -> None:
+        with self._lock:
+            owner = self._job_owners.pop(job_id, None)
+            if owner is None:
+                return
+            remaining = self._owner_counts.get(owner, 1) - 1
+            if remaining <= 0:
+                self._owner_counts.pop(owner, None)
+            else:
+                self._owner_counts[owner] = remaining
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            job = self.store.get(job_id)
+            if not job or job["status"] in TERMINAL_STATUSES:
+                self._release(job_id)
+                continue
+            self.store.update(job_id, status="running")
+            started = time.monotonic()
+            try:
+                result = self.handler(job["payload"])
+                self.store.update(job_id, status="done", result=result)
+            except Exception as e:
+                print(f"[jobs] job {job_id} failed: {e}")
+                self.store.update(job_id, status="error", error=str(e))
+            finally:
+                self._release(job_id)
+                # Exponentially weighted so Retry-After tracks current pipeline latency
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * (time.monotonic() - started)
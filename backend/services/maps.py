@@ -1,5 +1,8 @@
+import json
 import requests
 from typing import Dict, List, Optional
+
+from services.cassette import upstream
 # from urllib.parse import urlencode
 
 # --- New Places API endpoints ---
@@ -14,6 +17,37 @@ TEXTSEARCH_URL = f"{PLACES_API_BASE}/places:searchText"
 PHOTO_URL = f"{PLACES_API_BASE}/places"  # Will be used as base for photo URLs
 
 
+# ---------------------------
+# Upstream call helpers (recordable/replayable via services.cassette)
+# ---------------------------
+def _places_post(url: str, data: Dict, field_mask: str, maps_key: str, timeout: float) -> Dict:
+    def call() -> Dict:
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Goog-Api-Key': maps_key,
+            'X-Goog-FieldMask': field_mask
+        }
+        r = requests.post(url, json=data, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    # Key deliberately excludes the API key so cassettes are safe to share
+    return upstream("places", f"POST {url} {field_mask} {json.dumps(data, sort_keys=True)}", call)
+
+
+def _places_get(url: str, field_mask: str, maps_key: str, timeout: float) -> Dict:
+    def call() -> Dict:
+        headers = {
+            'X-Goog-Api-Key': maps_key,
+            'X-Goog-FieldMask': field_mask
+        }
+        r = requests.get(url, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    return upstream("places", f"GET {url} {field_mask}", call)
+
+
 # ---------------------------
 # Raw Text Search helper (for debugging/verification)
 # ---------------------------
@@ -25,15 +59,14 @@ def textsearch_raw(query: str, maps_key: str) -> Dict:
     if not maps_key:
         return {"status": "CONFIG_ERROR", "error": "Maps API key missing"}
     try:
-        headers = {
-            'Content-Type': 'application/json',
-            'X-Goog-Api-Key': maps_key,
-            'X-Goog-FieldMask': 'places.id,places.displayName,places.formattedAddress,places.location,places.photos'
-        }
         data = {"textQuery": query}
-        r = requests.post(TEXTSEARCH_URL, json=data, headers=headers, timeout=10)
-        r.raise_for_status()
-        j = r.json()
+        j = _places_post(
+            TEXTSEARCH_URL,
+            data,
+            'places.id,places.displayName,places.formattedAddress,places.location,places.photos',
+            maps_key,
+            timeout=10,
+        )
 
         # Convert new API response format to legacy-like format for compatibility
         places = j.get("places", [])
@@ -81,15 +114,8 @@ def enrich_with_maps(city: str, day: Dict, maps_key: str) -> Dict:
 
         q = f"{title} in {city}"
         try:
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Goog-Api-Key': maps_key,
-                'X-Goog-FieldMask': 'places.id,places.location'
-            }
             data = {"textQuery": q}
-            r = requests.post(TEXTSEARCH_URL, json=data, headers=headers, timeout=8)
-            r.raise_for_status()
-            places = r.json().get("places", [])
+            places = _places_post(TEXTSEARCH_URL, data, 'places.id,places.location', maps_key, timeout=8).get("places", [])
             place = places[0] if places else None
 
             # Convert to legacy format for compatibility
@@ -142,15 +168,8 @@ def get_destination_photo_reference(destination: str, maps_key: str) -> Optional
     for query in search_queries:
         try:
             print(f"[places_photo] trying query: {query!r}")
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Goog-Api-Key': maps_key,
-                'X-Goog-FieldMask': 'places.photos'
-            }
             data = {"textQuery": query}
-            r = requests.post(TEXTSEARCH_URL, json=data, headers=headers, timeout=10)
-            r.raise_for_status()
-            j = r.json()
+            j = _places_post(TEXTSEARCH_URL, data, 'places.photos', maps_key, timeout=10)
 
             places = j.get("places", [])
             if not places:
@@ -197,7 +216,7 @@ def get_destination_photo_reference(destination: str, maps_key: str) -> Optional
     return None
 
 
-def _build_photo_url_new(photo_name: str, maps_key: str, maxwidth: int = 1600) -> str:
+def build_photo_url(photo_name: str, maps_key: str, maxwidth: int = 1600) -> str:
     """
     Build a Places Photo URL using the photo name (new Places API).
     """
@@ -210,6 +229,23 @@ def _build_photo_url_new(photo_name: str, maps_key: str, maxwidth: int = 1600) -
         return f"{PLACES_API_BASE}/{photo_name}/media?maxWidthPx={maxwidth}&key={maps_key}"
 
 
+def get_place_photo_reference(place_id: str, maps_key: str) -> Optional[str]:
+    """
+    Look up the first photo name for an already-enriched place_id via Place Details.
+    Used to warm block thumbnails; returns None when the place has no photos.
+    """
+    if not maps_key or not place_id:
+        return None
+    try:
+        photos = _places_get(f"{PHOTO_URL}/{place_id}", 'photos', maps_key, timeout=8).get("photos") or []
+        for photo in photos:
+            if photo.get("name"):
+                return photo["name"]
+    except Exception as e:
+        print(f"[place_photo] details error for place_id={place_id!r}: {e}")
+    return None
+
+
 def get_destination_hero_image(destination: str, maps_key: str, maxwidth: int = 1600) -> Optional[str]:
     """
     Enhanced destination image retrieval with fallback options:
@@ -219,7 +255,7 @@ def get_destination_hero_image(destination: str, maps_key: str, maxwidth: int =
     """
     photo_name = get_destination_photo_reference(destination, maps_key)
     if photo_name:
-        return _build_photo_url_new(photo_name, maps_key, maxwidth)
+        return build_photo_url(photo_name, maps_key, maxwidth)
 
     print(f"[destination_hero] no Google Places photo found for {destination!r}")
     return None
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+# ---------------------------
+# Cache keys (shared by the media proxy routes and the prefetcher)
+# ---------------------------
+def destination_key(destination: str) -> str:
+    return f"destination:{destination.strip().lower()}"
+
+
+def place_key(place_id: str, maxwidth: int) -> str:
+    return f"place:{place_id}:{maxwidth}"
+
+
+def places_photo_key(ref: str, maxwidth: int) -> str:
+    return f"places-photo:{ref}:{maxwidth}"
+
+
+class MediaCache:
+    """
+    In-process LRU cache for proxied images plus the Places photo names that
+    resolve them. Image bytes are bounded by `max_bytes`; entries written by
+    the prefetcher are tracked separately so it can respect its own budget.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int = 86400, max_refs: int = 2048):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_refs = max_refs
+        self._lock = threading.Lock()
+        # key -> (content, content_type, stored_at, prefetched)
+        self._items: "OrderedDict[str, Tuple[bytes, str, float, bool]]" = OrderedDict()
+        # key -> (photo name, stored_at)
+        self._refs: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._prefetched_bytes = 0
+        # Bytes promised to in-flight prefetch downloads, counted against the prefetch budget
+        self._reserved_bytes = 0
+
+    # --- photo names ---
+    def get_ref(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._refs.get(key)
+            if not entry:
+                return None
+            ref, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._refs[key]
+                return None
+            self._refs.move_to_end(key)
+            return ref
+
+    def put_ref(self, key: str, ref: str) -> None:
+        with self._lock:
+            self._refs[key] = (ref, time.monotonic())
+            self._refs.move_to_end(key)
+            while len(self._refs) > self.max_refs:
+                self._refs.popitem(last=False)
+
+    # --- image bytes ---
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """
+        Return (content, content_type) for a cached image. A hit on a
+        prefetched entry counts it as demand-served, releasing it from the
+        prefetch budget.
+        """
+        with self._lock:
+            entry = self._items.get(key)
+            if not entry:
+                return None
+            content, content_type, stored_at, prefetched = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self._drop(key)
+                return None
+            if prefetched:
+                self._prefetched_bytes -= len(content)
+                self._items[key] = (content, content_type, stored_at, False)
+            self._items.move_to_end(key)
+            return content, content_type
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def put(self, key: str, content: bytes, content_type: str, prefetched: bool = False, reserved: int = 0) -> bool:
+        """
+        Store an image. `reserved` hands back a reserve_prefetch() grant in the
+        same step, so the stored bytes replace the reservation atomically.
+        """
+        size = len(content)
+        with self._lock:
+            self._reserved_bytes -= reserved
+            if size > self.max_bytes:
+                return False
+            if key in self._items:
+                self._drop(key)
+            while self._items and self._bytes + size > self.max_bytes:
+                self._drop(next(iter(self._items)))
+            self._items[key] = (content, content_type, time.monotonic(), prefetched)
+            self._bytes += size
+            if prefetched:
+                self._prefetched_bytes += size
+            return True
+
+    @property
+    def prefetched_bytes(self) -> int:
+        with self._lock:
+            return self._prefetched_bytes
+
+    def reserve_prefetch(self, max_bytes: int, budget: int) -> int:
+        """
+        Reserve up to `max_bytes` of the prefetch budget for one download.
+        Returns the number of bytes reserved (0 when the budget is spent);
+        the caller must hand it back via put(..., reserved=) or release_prefetch.
+        """
+        with self._lock:
+            available = budget - self._prefetched_bytes - self._reserved_bytes
+            granted = max(0, min(max_bytes, available))
+            self._reserved_bytes += granted
+            return granted
+
+    def release_prefetch(self, reserved: int) -> None:
+        with self._lock:
+            self._reserved_bytes -= reserved
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "prefetchedBytes": self._prefetched_bytes,
+                "reservedBytes": self._reserved_bytes,
+                "refs": len(self._refs),
+            }
+
+    def _drop(self, key: str) -> None:
+        # Caller holds the lock
+        content, _, _, prefetched = self._items.pop(key)
+        self._bytes -= len(content)
+        if prefetched:
+            self._prefetched_bytes -= len(content)
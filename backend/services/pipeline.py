@@ -0,0 +1,104 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Executor, Future, wait
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.profiler import active_profiler
+
+
+class PlanPipeline:
+    """
+    Stage tracker for one /plan run. `start()` launches an independent stage on
+    the shared executor right away (carrying the caller's context, so cassettes
+    and profilers follow the work); `stage()` times work done inline. The
+    report shows how much stage time overlapped instead of adding up.
+
+    The clock starts with the first stage, so time spent queued for admission
+    or a threadpool slot before the pipeline runs is not counted.
+    """
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self._t0: Optional[float] = None
+        self._lock = threading.Lock()
+        # stage -> (start offset, duration) in seconds
+        self._stages: Dict[str, Tuple[float, float]] = {}
+        self._futures: List[Future] = []
+
+    def _clock(self) -> float:
+        now = time.perf_counter()
+        with self._lock:
+            if self._t0 is None:
+                self._t0 = now
+        return now
+
+    def start(self, name: str, fn: Callable[..., Any], *args: Any) -> Future:
+        self._clock()
+        ctx = contextvars.copy_context()
+        future = self.executor.submit(ctx.run, self._timed, name, fn, *args)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def settle(self, wait_running: bool = False) -> None:
+        """
+        Cancel stages that haven't started. Running ones are left to finish in
+        the background unless `wait_running`, e.g. while a cassette is
+        recording so none of them appends to it after it has been saved.
+        """
+        with self._lock:
+            futures = list(self._futures)
+        running = [future for future in futures if not future.cancel()]
+        if wait_running:
+            wait(running)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self._record(name, started)
+
+    def _timed(self, name: str, fn: Callable[..., Any], *args: Any) -> Any:
+        profiler = active_profiler()
+        if profiler:
+            profiler.add_thread()
+        started = self._clock()
+        try:
+            return fn(*args)
+        finally:
+            self._record(name, started)
+            if profiler:
+                profiler.discard_thread()
+
+    def _record(self, name: str, started: float) -> None:
+        with self._lock:
+            self._stages[name] = (started - (self._t0 or started), time.perf_counter() - started)
+
+    def report(self) -> Dict:
+        with self._lock:
+            stages = dict(self._stages)
+            t0 = self._t0
+        wall = time.perf_counter() - t0 if t0 is not None else 0.0
+        serial = sum(duration for _, duration in stages.values())
+        return {
+            "wallMs": round(wall * 1000, 1),
+            "serialMs": round(serial * 1000, 1),
+            # Time saved by running stages concurrently rather than back to back
+            "overlapMs": round(max(0.0, serial - wall) * 1000, 1),
+            "stages": {
+                name: {"startMs": round(start * 1000, 1), "durationMs": round(duration * 1000, 1)}
+                for name, (start, duration) in sorted(stages.items(), key=lambda item: item[1][0])
+            },
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. `gemini;dur=1830.2, hero_lookup;dur=412.7, overlap;dur=409.9`."""
+        report = self.report()
+        parts = [f"{name};dur={s['durationMs']}" for name, s in report["stages"].items()]
+        parts.append(f"overlap;dur={report['overlapMs']}")
+        parts.append(f"total;dur={report['wallMs']}")
+        return ", ".join(parts)
@@ -0,0 +1,213 @@
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from services.media_cache import MediaCache
+
+# A resolver returns the upstream image URL for a cache key (it may do Places lookups)
+Resolver = Callable[[], Optional[str]]
+
+
+class Prefetcher:
+    """
+    Bounded background queue that warms MediaCache after /plan returns.
+
+    - Jobs are grouped (one group per trip) so a whole trip can be cancelled.
+    - A cache key is queued at most once while pending, and skipped if already cached.
+      Every group that asks for a pending key waits on the same job, which is only
+      skipped once all of those groups have been cancelled.
+    - `workers` caps upstream concurrency; `byte_budget` caps how many bytes of
+      not-yet-requested prefetched images may sit in the cache at once.
+    - When the queue is full new jobs are dropped rather than blocking the caller.
+    """
+
+    def __init__(
+        self,
+        cache: MediaCache,
+        workers: int = 2,
+        max_queue: int = 64,
+        byte_budget: int = 24 * 1024 * 1024,
+        max_item_bytes: int = 4 * 1024 * 1024,
+        timeout: float = 15.0,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.byte_budget = byte_budget
+        self.max_item_bytes = max_item_bytes
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._queue: "queue.Queue[Optional[Tuple[str, Resolver]]]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # key -> groups waiting on its queued or in-flight job
+        self._pending: Dict[str, Set[str]] = {}
+        self._group_counts: Dict[str, int] = {}
+        self._cancelled: Set[str] = set()
+        # owner (e.g. client) -> its most recent group, so a new /plan can cancel the last one
+        self._owner_groups: "OrderedDict[str, str]" = OrderedDict()
+        self._max_owners = 4096
+        self._threads: List[threading.Thread] = []
+        self._client: Optional[httpx.Client] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._client = httpx.Client(timeout=self.timeout, follow_redirects=True, headers=self.headers)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"prefetch-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[prefetch] started {self.workers} workers")
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        # Drain queued jobs so workers see the sentinels promptly
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job:
+                self._finish(job[0])
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=self.timeout)
+        self._threads = []
+        if self._client:
+            self._client.close()
+            self._client = None
+
+    def submit(self, group: str, key: str, resolve: Resolver) -> bool:
+        """
+        Queue a prefetch job. Returns False if it was deduplicated, already
+        cached, cancelled, or dropped because the queue is full. A deduplicated
+        key still counts for `group`, so cancelling another group that queued
+        it first doesn't drop it.
+        """
+        if self._stopping.is_set() or not self._threads:
+            return False
+        if self.cache.contains(key):
+            return False
+        with self._lock:
+            if group in self._cancelled:
+                return False
+            waiting = self._pending.get(key)
+            if waiting is not None:
+                if group not in waiting:
+                    waiting.add(group)
+                    self._group_counts[group] = self._group_counts.get(group, 0) + 1
+                return False
+            self._pending[key] = {group}
+            self._group_counts[group] = self._group_counts.get(group, 0) + 1
+        try:
+            self._queue.put_nowait((key, resolve))
+        except queue.Full:
+            print(f"[prefetch] queue full, dropping {key}")
+            self._finish(key)
+            return False
+        return True
+
+    def cancel(self, group: str) -> None:
+        """Skip any queued or not-yet-downloaded jobs belonging to `group`."""
+        with self._lock:
+            if self._group_counts.get(group):
+                self._cancelled.add(group)
+
+    def assign(self, owner: str, group: str) -> None:
+        """Record `group` as `owner`'s current trip (see cancel_owner)."""
+        with self._lock:
+            self._owner_groups[owner] = group
+            self._owner_groups.move_to_end(owner)
+            while len(self._owner_groups) > self._max_owners:
+                self._owner_groups.popitem(last=False)
+
+    def cancel_owner(self, owner: str) -> None:
+        """Cancel whatever is still pending for `owner`'s previous trip."""
+        with self._lock:
+            group = self._owner_groups.pop(owner, None)
+        if group:
+            self.cancel(group)
+
+    def _is_cancelled(self, key: str) -> bool:
+        """True once every group waiting on `key` has been cancelled."""
+        with self._lock:
+            if self._stopping.is_set():
+                return True
+            return all(group in self._cancelled for group in self._pending.get(key, ()))
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            for group in self._pending.pop(key, ()):
+                remaining = self._group_counts.get(group, 1) - 1
+                if remaining <= 0:
+                    self._group_counts.pop(group, None)
+                    self._cancelled.discard(group)
+                else:
+                    self._group_counts[group] = remaining
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            key, resolve = job
+            try:
+                self._prefetch(key, resolve)
+            except Exception as e:
+                print(f"[prefetch] error for {key}: {e}")
+            finally:
+                self._finish(key)
+
+    def _prefetch(self, key: str, resolve: Resolver) -> None:
+        if self._is_cancelled(key) or self.cache.contains(key):
+            return
+
+        # Reserve before downloading so concurrent workers can't jointly overshoot the budget
+        limit = self.cache.reserve_prefetch(self.max_item_bytes, self.byte_budget)
+        if limit <= 0:
+            print(f"[prefetch] byte budget exhausted, skipping {key}")
+            return
+        try:
+            downloaded = self._download(key, resolve, limit)
+            if downloaded:
+                stored = self.cache.put(key, downloaded[0], downloaded[1], prefetched=True, reserved=limit)
+                limit = 0  # put() hands the reservation back either way
+                if stored:
+                    print(f"[prefetch] warmed {key} ({len(downloaded[0])} bytes)")
+        finally:
+            if limit:
+                self.cache.release_prefetch(limit)
+
+    def _download(self, key: str, resolve: Resolver, limit: int) -> Optional[Tuple[bytes, str]]:
+        url = resolve()
+        if not url or self._is_cancelled(key) or not self._client:
+            return None
+
+        with self._client.stream("GET", url) as r:
+            if r.status_code != 200:
+                print(f"[prefetch] upstream status={r.status_code} for {key}")
+                return None
+            content_type = r.headers.get("content-type", "image/jpeg")
+            if not content_type.startswith("image/"):
+                print(f"[prefetch] unexpected content-type {content_type} for {key}")
+                return None
+            chunks: List[bytes] = []
+            size = 0
+            for chunk in r.iter_bytes():
+                if self._is_cancelled(key):
+                    return None
+                size += len(chunk)
+                if size > limit:
+                    print(f"[prefetch] {key} exceeds byte budget, abandoning")
+                    return None
+                chunks.append(chunk)
+        return b"".join(chunks), content_type
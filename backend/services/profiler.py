@@ -0,0 +1,122 @@
+import contextvars
+import hashlib
+import hmac
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional, Set, Tuple
+
+_active: "contextvars.ContextVar[Optional[SamplingProfiler]]" = contextvars.ContextVar("plangenie_profiler", default=None)
+
+
+def sign_profile_token(secret: str, timestamp: Optional[int] = None) -> str:
+    """Build a `<unix-ts>.<hmac-sha256>` token accepted by verify_profile_token."""
+    ts = str(int(timestamp if timestamp is not None else time.time()))
+    sig = hmac.new(secret.encode(), ts.encode(), hashlib.sha256).hexdigest()
+    return f"{ts}.{sig}"
+
+
+def verify_profile_token(token: str, secret: str, max_age: int = 300) -> bool:
+    if not token or not secret or "." not in token:
+        return False
+    ts, sig = token.split(".", 1)
+    try:
+        if abs(time.time() - int(ts)) > max_age:
+            return False
+    except ValueError:
+        return False
+    expected = hmac.new(secret.encode(), ts.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, sig)
+
+
+class SamplingProfiler:
+    """
+    Low-overhead wall-clock sampler for the threads serving one request.
+    A background thread snapshots the registered threads' stacks every
+    `interval` seconds; results come out as collapsed stacks (flamegraph.pl /
+    speedscope format) plus a per-function self-sample summary.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._threads: Set[int] = set()
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration = 0.0
+
+    def add_thread(self, thread_id: Optional[int] = None) -> None:
+        self._threads.add(thread_id if thread_id is not None else threading.get_ident())
+
+    def discard_thread(self, thread_id: Optional[int] = None) -> None:
+        self._threads.discard(thread_id if thread_id is not None else threading.get_ident())
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self._threads):
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[";".join(reversed(stack))] += 1
+                self._samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def top(self, limit: int = 15) -> List[Tuple[str, int, float]]:
+        """(function, self samples, share of samples) for the hottest leaf frames."""
+        leaves: Counter = Counter()
+        for stack, count in self._stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = max(1, self._samples)
+        return [(fn, n, round(n / total, 3)) for fn, n in leaves.most_common(limit)]
+
+    def summary(self) -> str:
+        lines = [f"samples={self._samples} interval={self.interval * 1000:.1f}ms wall={self.duration:.3f}s"]
+        for fn, n, share in self.top():
+            lines.append(f"{share:6.1%} {n:6d}  {fn}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profiling(profiler: Optional[SamplingProfiler]):
+    """
+    Sample the current thread for the duration of the block. Helper threads
+    that run with a copy of this context can join via `active_profiler()`.
+    """
+    if profiler is None:
+        yield None
+        return
+    token = _active.set(profiler)
+    profiler.add_thread()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active.reset(token)
+
+
+def active_profiler() -> Optional[SamplingProfiler]:
+    return _active.get()
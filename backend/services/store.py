@@ -1,10 +1,52 @@
+import threading
 from google.cloud import firestore
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Tuple
+
+from services.cassette import upstream
+
+# One client per project: credential discovery and channel setup happen once per process
+_clients: Dict[str, firestore.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def _client(project_id: str) -> firestore.Client:
+    with _clients_lock:
+        if project_id not in _clients:
+            _clients[project_id] = firestore.Client(project=project_id)
+        return _clients[project_id]
+
+
+def warm_client(project_id: str) -> None:
+    """Build the Firestore client ahead of the first write (runs alongside Gemini in /plan)."""
+    def warm() -> None:
+        _client(project_id)
+
+    try:
+        upstream("firestore", "client.warm", warm)
+    except Exception as e:
+        # Not fatal: save_itinerary will build the client (and surface the error) itself
+        print(f"[firestore] warm-up failed: {e}")
+
 
 def save_itinerary(project_id: str, trip: Dict) -> str:
-    db = firestore.Client(project=project_id)
-    ref = db.collection("trip").document()
     trip["createdAt"] = datetime.utcnow().isoformat() + "Z"
-    ref.set(trip)
-    return ref.id
+
+    def write() -> str:
+        db = _client(project_id)
+        ref = db.collection("trip").document()
+        ref.set(trip)
+        return ref.id
+
+    return upstream("firestore", "trip.add", write)
+
+
+def list_itineraries(project_id: str, limit: int = 500) -> List[Tuple[str, Dict]]:
+    """Most recent stored trips as (trip_id, document) pairs."""
+    db = _client(project_id)
+    query = (
+        db.collection("trip")
+        .order_by("createdAt", direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+    return [(doc.id, doc.to_dict() or {}) for doc in query.stream()]
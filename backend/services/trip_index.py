@@ -0,0 +1,175 @@
+import copy
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _norm_destination(value: Optional[str]) -> str:
+    # "Jaipur, Rajasthan" and "jaipur" should land in the same bucket
+    return (value or "").split(",")[0].strip().lower()
+
+
+# Titles produced by gemini._fallback_blocks; trips saved before `source` was recorded
+# are recognised as generic fallbacks by these
+_FALLBACK_BLOCK_TITLES = {"Local Lunch Spot", "Evening Cultural Experience"}
+
+
+def _is_generated_trip(itinerary: Dict) -> bool:
+    source = itinerary.get("source")
+    if source is not None:
+        return source == "gemini"
+    days = (itinerary.get("itineraryDraft") or {}).get("days") or []
+    titles = {b.get("title") for d in days for b in (d.get("blocks") or []) if isinstance(b, dict)}
+    return not titles & _FALLBACK_BLOCK_TITLES
+
+
+def _trip_length(prefs: Dict) -> int:
+    try:
+        start = datetime.strptime(prefs.get("startDate", ""), "%Y-%m-%d").date()
+        end = datetime.strptime(prefs.get("endDate", ""), "%Y-%m-%d").date()
+        return max(1, (end - start).days + 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+class TripIndex:
+    """
+    In-memory index of previously generated (and enriched) itineraries,
+    bucketed by destination and ranked by mood and trip length. Used to serve
+    an instant preview for async /plan jobs and a realistic fallback when
+    Gemini fails. Only trips at least as long as the request and within
+    `max_mood_distance` / `max_extra_days` of it count as similar.
+    """
+
+    def __init__(self, max_per_destination: int = 20, max_mood_distance: int = 1, max_extra_days: int = 3):
+        self.max_per_destination = max_per_destination
+        self.max_mood_distance = max_mood_distance
+        self.max_extra_days = max_extra_days
+        self._lock = threading.Lock()
+        # destination -> entries, most recent last
+        self._by_destination: Dict[str, List[Dict]] = {}
+
+    def add(self, trip_id: str, itinerary: Dict) -> None:
+        prefs = itinerary.get("prefs") or {}
+        draft = itinerary.get("itineraryDraft") or {}
+        if not draft.get("days"):
+            return
+        entry = {
+            "tripId": trip_id,
+            "mood": prefs.get("mood", 2),
+            "pax": prefs.get("pax") or 1,
+            "length": _trip_length(prefs),
+            "draft": copy.deepcopy(draft),
+        }
+        # Index under both the requested destination ("JAI") and Gemini's resolved city ("Jaipur")
+        keys = {_norm_destination(prefs.get("destination")), _norm_destination(draft.get("city"))}
+        with self._lock:
+            for key in keys - {""}:
+                bucket = self._by_destination.setdefault(key, [])
+                bucket[:] = [e for e in bucket if e["tripId"] != trip_id]
+                bucket.append(entry)
+                del bucket[:-self.max_per_destination]
+
+    def find(self, prefs: Dict) -> Optional[Dict]:
+        """Closest stored trip for the same destination, or None if none is close enough."""
+        with self._lock:
+            bucket = list(self._by_destination.get(_norm_destination(prefs.get("destination")), []))
+        want_mood = prefs.get("mood", 2)
+        want_length = _trip_length(prefs)
+
+        # Shorter trips would need invented days, so they never qualify
+        candidates = [
+            (position, e)
+            for position, e in enumerate(bucket)
+            if abs(e["mood"] - want_mood) <= self.max_mood_distance
+            and 0 <= e["length"] - want_length <= self.max_extra_days
+        ]
+        if not candidates:
+            return None
+
+        def score(item: Tuple[int, Dict]) -> Tuple[int, int]:
+            position, e = item
+            # Mood matters more than length; newer trips win ties
+            return 2 * abs(e["mood"] - want_mood) + (e["length"] - want_length), -position
+
+        return min(candidates, key=score)[1]
+
+    def preview(self, prefs: Dict) -> Optional[Dict]:
+        """
+        Return a copy of the closest stored draft re-dated to the requested
+        trip: its first days are kept up to the requested length, and the
+        budget is scaled roughly by pax and days. `similarTo` names the source
+        trip; callers persisting the draft should move it out of the draft.
+        """
+        entry = self.find(prefs)
+        if not entry:
+            return None
+
+        draft = copy.deepcopy(entry["draft"])
+        source_days = draft.get("days") or []
+        length = _trip_length(prefs)
+        try:
+            start = datetime.strptime(prefs.get("startDate", ""), "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            start = None
+
+        days = source_days[:length]
+        if start:
+            for i, day in enumerate(days):
+                day["date"] = (start + timedelta(days=i)).isoformat()
+        draft["days"] = days
+
+        budget = draft.get("total_budget")
+        if isinstance(budget, (int, float)):
+            pax_ratio = (prefs.get("pax") or 1) / entry["pax"]
+            day_ratio = length / entry["length"]
+            draft["total_budget"] = round(budget * pax_ratio * day_ratio, 2)
+
+        draft["similarTo"] = entry["tripId"]
+        return draft
+
+    def rebuild(self, trips: Iterable[Tuple[str, Dict]]) -> int:
+        """
+        Replace the index contents with (trip_id, itinerary) pairs, oldest
+        first; returns the number of trips indexed.
+        """
+        with self._lock:
+            self._by_destination = {}
+        count = 0
+        for trip_id, itinerary in trips:
+            # Generic fallbacks and re-dated copies would only echo other entries
+            if not isinstance(itinerary, dict) or not _is_generated_trip(itinerary):
+                continue
+            if not (itinerary.get("itineraryDraft") or {}).get("days"):
+                continue
+            self.add(trip_id, itinerary)
+            count += 1
+        return count
+
+    def rebuild_from_export(self, path: str) -> int:
+        """
+        Rebuild from a JSON export of the `trip` collection: either a JSON
+        array or one document per line. Each document needs `prefs` and
+        `itineraryDraft`; the id is read from `id`, `tripId` or `__name__`.
+        """
+        with open(path, encoding="utf-8") as f:
+            text = f.read().strip()
+        if text.startswith("["):
+            docs = json.loads(text)
+        else:
+            docs = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+        def pairs():
+            for i, doc in enumerate(docs):
+                trip_id = doc.get("id") or doc.get("tripId") or str(doc.get("__name__", "")).split("/")[-1]
+                yield trip_id or f"export-{i}", doc
+
+        return self.rebuild(pairs())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "destinations": len(self._by_destination),
+                "entries": sum(len(b) for b in self._by_destination.values()),
+            }
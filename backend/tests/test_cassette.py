@@ -0,0 +1,71 @@
+import pytest
+
+from services.cassette import Cassette, CassetteMiss, ReplayedUpstreamError, upstream, use_cassette
+
+
+def _record(path):
+    cassette = Cassette("record", meta={"request": {"destination": "Jaipur"}})
+    with use_cassette(cassette):
+        draft = upstream("gemini", "prompt-1", lambda: {"city": "Jaipur", "days": [{"blocks": []}]})
+        # Callers mutate responses afterwards; the recording must keep what upstream returned
+        draft["days"][0]["blocks"].append({"title": "enriched"})
+        upstream("places", "hawa mahal", lambda: {"id": "p1"})
+        upstream("places", "hawa mahal", lambda: {"id": "p2"})
+        with pytest.raises(TimeoutError):
+            upstream("firestore", "trip.add", _timeout)
+    cassette.save(str(path))
+    return cassette
+
+
+def _timeout():
+    raise TimeoutError("deadline exceeded")
+
+
+def test_record_then_replay_returns_the_same_responses_in_order(tmp_path):
+    path = tmp_path / "c.cassette.json"
+    recorded = _record(path)
+    assert set(recorded.upstream_seconds()) == {"gemini", "places", "firestore"}
+
+    replay = Cassette.load(str(path), replay_timing=False)
+    assert replay.meta == {"request": {"destination": "Jaipur"}}
+    with use_cassette(replay):
+        assert upstream("gemini", "prompt-1", _unreachable) == {"city": "Jaipur", "days": [{"blocks": []}]}
+        assert upstream("places", "hawa mahal", _unreachable) == {"id": "p1"}
+        assert upstream("places", "hawa mahal", _unreachable) == {"id": "p2"}
+        with pytest.raises(ReplayedUpstreamError, match="TimeoutError: deadline exceeded"):
+            upstream("firestore", "trip.add", _unreachable)
+    assert replay.misses == []
+
+
+def _unreachable():
+    raise AssertionError("replay must not call upstream")
+
+
+def test_replay_misses_are_raised_and_remembered(tmp_path):
+    path = tmp_path / "c.cassette.json"
+    _record(path)
+    replay = Cassette.load(str(path), replay_timing=False)
+    with use_cassette(replay):
+        with pytest.raises(CassetteMiss):
+            upstream("places", "amber fort", _unreachable)
+        upstream("gemini", "prompt-1", _unreachable)
+        with pytest.raises(CassetteMiss):
+            upstream("gemini", "prompt-1", _unreachable)  # recorded once, asked twice
+    assert len(replay.misses) == 2
+    assert "amber fort" in replay.misses[0]
+
+
+def test_offsets_are_relative_to_the_first_call(tmp_path):
+    recorded = _record(tmp_path / "c.cassette.json")
+    offsets = [e["offset"] for e in recorded.to_dict()["interactions"]]
+    assert offsets[0] == 0
+    assert offsets == sorted(offsets)
+
+
+def test_upstream_without_a_cassette_just_calls_through():
+    assert upstream("places", "key", lambda: 42) == 42
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        Cassette("rewind")
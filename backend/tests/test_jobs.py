@@ -0,0 +1,143 @@
+import threading
+import time
+
+import pytest
+
+from services.jobs import InMemoryJobStore, JobQueueFull, JobRunner, JobStore, SqliteJobStore
+
+
+def wait_for_status(store, job_id, statuses=("done", "error"), timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job and job["status"] in statuses:
+            return job
+        time.sleep(0.005)
+    return store.get(job_id)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteJobStore(str(tmp_path / "jobs.sqlite3"))
+    return InMemoryJobStore()
+
+
+def test_job_store_cannot_be_instantiated_directly():
+    with pytest.raises(TypeError):
+        JobStore()
+
+
+def test_runner_runs_jobs_and_records_results(store):
+    runner = JobRunner(store, lambda payload: {"echo": payload["n"]}, workers=2)
+    runner.start()
+    try:
+        job = runner.submit({"n": 1})
+        assert job["status"] == "queued"
+        done = wait_for_status(store, job["id"])
+        assert done["status"] == "done"
+        assert done["result"] == {"echo": 1}
+    finally:
+        runner.shutdown()
+
+
+def test_handler_errors_mark_the_job_failed(store):
+    def handler(payload):
+        raise ValueError("boom")
+
+    runner = JobRunner(store, handler, workers=1)
+    runner.start()
+    try:
+        job = runner.submit({})
+        failed = wait_for_status(store, job["id"])
+        assert failed["status"] == "error"
+        assert failed["error"] == "boom"
+    finally:
+        runner.shutdown()
+
+
+def test_full_queue_sheds_without_leaving_a_job_behind(store):
+    # Not started: nothing drains the queue
+    runner = JobRunner(store, lambda payload: {}, workers=1, max_queue=1)
+    kept = runner.submit({"n": 1})
+    with pytest.raises(JobQueueFull):
+        runner.submit({"n": 2})
+    assert [j["id"] for j in store.list_unfinished()] == [kept["id"]]
+    assert runner.retry_after() >= 1
+
+
+def test_sqlite_jobs_resume_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = SqliteJobStore(path)
+    queued = first.create("queued-job", {"n": 1})
+    running = first.create("running-job", {"n": 2})
+    first.update(running["id"], status="running")
+    first.create("done-job", {"n": 3})
+    first.update("done-job", status="done", result={"echo": 3})
+
+    # A new process opens the same database
+    seen = []
+    lock = threading.Lock()
+
+    def handler(payload):
+        with lock:
+            seen.append(payload["n"])
+        return {"echo": payload["n"]}
+
+    store = SqliteJobStore(path)
+    runner = JobRunner(store, handler, workers=1)
+    runner.start()
+    try:
+        assert wait_for_status(store, queued["id"])["result"] == {"echo": 1}
+        assert wait_for_status(store, running["id"])["result"] == {"echo": 2}
+    finally:
+        runner.shutdown()
+    assert sorted(seen) == [1, 2]
+    assert store.get("done-job")["result"] == {"echo": 3}
+
+
+def test_jobs_that_cannot_be_resumed_are_failed(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first = SqliteJobStore(path)
+    first.create("a", {})
+    first.create("b", {})
+
+    # Room for one resumed job; the other is failed rather than silently dropped
+    store = SqliteJobStore(path)
+    runner = JobRunner(store, lambda payload: {}, workers=1, max_queue=1)
+    runner.start()
+    try:
+        failed = [job for job in (store.get("a"), store.get("b")) if job["status"] == "error"]
+        assert [job["error"] for job in failed] == ["Job could not be resumed after restart"]
+    finally:
+        runner.shutdown()
+
+
+def test_per_owner_cap_leaves_room_for_other_clients(store):
+    runner = JobRunner(store, lambda payload: {}, workers=1, max_queue=10, max_per_owner=2)
+    runner.submit({}, "ip:a")
+    runner.submit({}, "ip:a")
+    with pytest.raises(JobQueueFull) as exc:
+        runner.submit({}, "ip:a")
+    assert exc.value.reason == "Too many plan jobs queued for this client"
+    runner.submit({}, "ip:b")
+    assert len(store.list_unfinished()) == 3
+
+
+def test_owner_slots_free_up_when_jobs_finish(store):
+    release = threading.Event()
+    runner = JobRunner(store, lambda payload: release.wait(2) and {}, workers=1, max_queue=10, max_per_owner=1)
+    runner.start()
+    try:
+        first = runner.submit({}, "ip:a")
+        with pytest.raises(JobQueueFull):
+            runner.submit({}, "ip:a")
+        release.set()
+        assert wait_for_status(store, first["id"])["status"] == "done"
+        deadline = time.monotonic() + 2
+        while runner._owner_counts and time.monotonic() < deadline:
+            time.sleep(0.005)
+        second = runner.submit({}, "ip:a")
+        assert wait_for_status(store, second["id"])["status"] == "done"
+    finally:
+        runner.shutdown()
@@ -0,0 +1,53 @@
+from services.media_cache import MediaCache
+
+
+def test_reservations_share_the_prefetch_budget():
+    cache = MediaCache(max_bytes=1000)
+    assert cache.reserve_prefetch(60, budget=100) == 60
+    # Only what is left of the budget is granted, then nothing
+    assert cache.reserve_prefetch(60, budget=100) == 40
+    assert cache.reserve_prefetch(60, budget=100) == 0
+    assert cache.stats()["reservedBytes"] == 100
+
+
+def test_put_swaps_reservation_for_stored_bytes():
+    cache = MediaCache(max_bytes=1000)
+    reserved = cache.reserve_prefetch(50, budget=100)
+    assert cache.put("k", b"x" * 20, "image/jpeg", prefetched=True, reserved=reserved)
+    stats = cache.stats()
+    assert stats["reservedBytes"] == 0
+    assert stats["prefetchedBytes"] == 20
+    # The unused part of the reservation is available again
+    assert cache.reserve_prefetch(100, budget=100) == 80
+
+
+def test_rejected_put_still_returns_the_reservation():
+    cache = MediaCache(max_bytes=10)
+    reserved = cache.reserve_prefetch(50, budget=100)
+    assert not cache.put("k", b"x" * 20, "image/jpeg", prefetched=True, reserved=reserved)
+    assert cache.stats()["reservedBytes"] == 0
+    assert not cache.contains("k")
+
+
+def test_release_prefetch_returns_an_unused_reservation():
+    cache = MediaCache(max_bytes=1000)
+    reserved = cache.reserve_prefetch(70, budget=100)
+    cache.release_prefetch(reserved)
+    assert cache.reserve_prefetch(100, budget=100) == 100
+
+
+def test_demand_hit_releases_prefetched_bytes_from_the_budget():
+    cache = MediaCache(max_bytes=1000)
+    cache.put("k", b"x" * 30, "image/jpeg", prefetched=True)
+    assert cache.prefetched_bytes == 30
+    assert cache.get("k") == (b"x" * 30, "image/jpeg")
+    assert cache.prefetched_bytes == 0
+    assert cache.stats()["bytes"] == 30
+
+
+def test_eviction_keeps_prefetched_accounting_consistent():
+    cache = MediaCache(max_bytes=50)
+    cache.put("a", b"x" * 30, "image/jpeg", prefetched=True)
+    cache.put("b", b"y" * 30, "image/jpeg")
+    assert not cache.contains("a")
+    assert cache.stats() == {"items": 1, "bytes": 30, "prefetchedBytes": 0, "reservedBytes": 0, "refs": 0}
@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.cassette import Cassette, current_cassette, use_cassette
+from services.pipeline import PlanPipeline
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=2)
+    yield pool
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_concurrent_stages_report_their_overlap(executor):
+    pipeline = PlanPipeline(executor)
+    future = pipeline.start("hero_lookup", time.sleep, 0.1)
+    with pipeline.stage("gemini"):
+        time.sleep(0.1)
+    future.result()
+
+    report = pipeline.report()
+    assert set(report["stages"]) == {"hero_lookup", "gemini"}
+    assert report["serialMs"] >= 200
+    # Both ran side by side: wall time is well under their sum
+    assert report["wallMs"] < report["serialMs"]
+    assert report["overlapMs"] >= 50
+
+
+def test_clock_starts_at_the_first_stage(executor):
+    pipeline = PlanPipeline(executor)
+    time.sleep(0.1)  # e.g. waiting for an admission slot
+    with pipeline.stage("gemini"):
+        pass
+    report = pipeline.report()
+    assert report["wallMs"] < 50
+    assert report["stages"]["gemini"]["startMs"] == 0
+
+
+def test_server_timing_lists_stages_then_overlap_and_total(executor):
+    pipeline = PlanPipeline(executor)
+    with pipeline.stage("gemini"):
+        pass
+    pipeline.start("firestore_warmup", lambda: None).result()
+    parts = [part.split(";dur=")[0] for part in pipeline.server_timing().split(", ")]
+    assert parts == ["gemini", "firestore_warmup", "overlap", "total"]
+
+
+def test_stages_run_with_the_callers_context(executor):
+    pipeline = PlanPipeline(executor)
+    cassette = Cassette("record")
+    with use_cassette(cassette):
+        future = pipeline.start("probe", current_cassette)
+    assert future.result() is cassette
+
+
+def test_settle_cancels_queued_stages_without_waiting_for_running_ones():
+    executor = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    try:
+        pipeline = PlanPipeline(executor)
+        running = pipeline.start("hero_lookup", release.wait, 2)
+        queued = pipeline.start("hero_lookup_city", lambda: None)
+        started = time.perf_counter()
+        pipeline.settle()
+        assert time.perf_counter() - started < 0.5
+        assert queued.cancelled()
+        assert not running.done()
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+
+
+def test_settle_can_wait_for_running_stages():
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        pipeline = PlanPipeline(executor)
+        running = pipeline.start("hero_lookup", time.sleep, 0.05)
+        queued = pipeline.start("hero_lookup_city", time.sleep, 5)
+        pipeline.settle(wait_running=True)
+        assert running.done() and queued.cancelled()
+    finally:
+        executor.shutdown(wait=True)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from services.media_cache import MediaCache
+from services.prefetch import Prefetcher
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+@pytest.fixture
+def prefetcher():
+    # One worker, and downloads that answer from memory; "blocker" holds the worker until released
+    cache = MediaCache(max_bytes=1024 * 1024)
+    p = Prefetcher(cache, workers=1, byte_budget=1024, max_item_bytes=100)
+    p.gate = threading.Event()
+    p.downloads = []
+
+    def fake_download(key, resolve, limit):
+        if key == "blocker":
+            p.gate.wait(2)
+        p.downloads.append(key)
+        return b"x" * 10, "image/jpeg"
+
+    p._download = fake_download
+    p.start()
+    yield p
+    p.gate.set()
+    p.shutdown()
+
+
+def _idle(p):
+    return lambda: not p._pending and p._queue.empty()
+
+
+def test_replan_of_same_key_is_not_lost_to_the_cancelled_trip(prefetcher):
+    p = prefetcher
+    assert p.submit("trip0", "blocker", lambda: "url")
+    assert p.submit("trip1", "destination:jaipur", lambda: "url")
+    # Client re-plans Jaipur: its previous trip is cancelled, then the new trip asks for the same hero
+    p.cancel("trip1")
+    assert not p.submit("trip2", "destination:jaipur", lambda: "url")  # deduplicated onto the queued job
+    p.gate.set()
+    assert wait_until(lambda: p.cache.contains("destination:jaipur"))
+    assert wait_until(_idle(p))
+    assert p._group_counts == {} and p._cancelled == set()
+
+
+def test_cancelled_group_skips_its_queued_jobs(prefetcher):
+    p = prefetcher
+    assert p.submit("trip0", "blocker", lambda: "url")
+    assert p.submit("trip1", "place:a:400", lambda: "url")
+    assert p.submit("trip1", "place:b:400", lambda: "url")
+    p.cancel("trip1")
+    p.gate.set()
+    assert wait_until(_idle(p))
+    assert p.downloads == ["blocker"]
+    assert not p.cache.contains("place:a:400")
+    # Once its jobs are drained the group's cancellation is forgotten
+    assert p._cancelled == set()
+
+
+def test_duplicate_and_cached_keys_are_not_queued_again(prefetcher):
+    p = prefetcher
+    assert p.submit("trip0", "blocker", lambda: "url")
+    assert p.submit("trip1", "place:a:400", lambda: "url")
+    assert not p.submit("trip1", "place:a:400", lambda: "url")
+    p.gate.set()
+    assert wait_until(_idle(p))
+    assert not p.submit("trip2", "place:a:400", lambda: "url")
+    assert p.downloads == ["blocker", "place:a:400"]
+
+
+def test_cancel_owner_cancels_only_the_owners_latest_trip(prefetcher):
+    p = prefetcher
+    assert p.submit("trip0", "blocker", lambda: "url")
+    p.assign("client-a", "trip1")
+    assert p.submit("trip1", "place:a:400", lambda: "url")
+    p.assign("client-b", "trip2")
+    assert p.submit("trip2", "place:b:400", lambda: "url")
+    p.cancel_owner("client-a")
+    p.gate.set()
+    assert wait_until(_idle(p))
+    assert p.downloads == ["blocker", "place:b:400"]
+
+
+def test_byte_budget_stops_prefetching_until_bytes_are_served(prefetcher):
+    p = prefetcher
+    p.byte_budget = 20  # two 10-byte images
+    p.gate.set()
+    for key in ("place:a:400", "place:b:400", "place:c:400"):
+        assert p.submit("trip1", key, lambda: "url")
+        assert wait_until(_idle(p))
+    assert p.downloads == ["place:a:400", "place:b:400"]
+    assert p.cache.stats()["reservedBytes"] == 0
+    # A demand hit frees budget for the next prefetch
+    assert p.cache.get("place:a:400")
+    assert p.submit("trip1", "place:c:400", lambda: "url")
+    assert wait_until(lambda: p.cache.contains("place:c:400"))
@@ -0,0 +1,40 @@
+import time
+
+from services.profiler import SamplingProfiler, profiling, sign_profile_token, verify_profile_token
+
+SECRET = "s3cret"
+
+
+def test_fresh_token_is_accepted():
+    assert verify_profile_token(sign_profile_token(SECRET), SECRET)
+
+
+def test_expired_and_future_tokens_are_rejected():
+    now = int(time.time())
+    assert not verify_profile_token(sign_profile_token(SECRET, now - 301), SECRET)
+    assert not verify_profile_token(sign_profile_token(SECRET, now + 301), SECRET)
+    assert verify_profile_token(sign_profile_token(SECRET, now - 60), SECRET, max_age=120)
+
+
+def test_tampered_tokens_are_rejected():
+    token = sign_profile_token(SECRET)
+    ts, sig = token.split(".", 1)
+    assert not verify_profile_token(f"{int(ts) + 1}.{sig}", SECRET)
+    assert not verify_profile_token(f"{ts}.{sig[:-1]}{'0' if sig[-1] != '0' else '1'}", SECRET)
+    assert not verify_profile_token(token, "other-secret")
+
+
+def test_malformed_tokens_and_missing_secret_are_rejected():
+    for token in ("", "no-dot", "abc.def", "."):
+        assert not verify_profile_token(token, SECRET)
+    assert not verify_profile_token(sign_profile_token(SECRET), "")
+
+
+def test_profiler_samples_the_profiled_thread():
+    profiler = SamplingProfiler(interval=0.001)
+    with profiling(profiler):
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+    assert profiler.top()
+    assert "test_profiler_samples_the_profiled_thread" in profiler.collapsed()
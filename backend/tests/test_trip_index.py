@@ -0,0 +1,100 @@
+import json
+
+from services.trip_index import TripIndex
+
+
+def _trip(destination="JAI", city="Jaipur", mood=2, start="2024-08-01", end="2024-08-02", pax=2, titles=None, **extra):
+    titles = titles or [["City Palace", "Amber Fort"], ["Hawa Mahal", "Jal Mahal"]]
+    days = [
+        {"date": f"2024-08-0{i + 1}", "blocks": [{"title": t, "place_id": f"p-{t}"} for t in day]}
+        for i, day in enumerate(titles)
+    ]
+    trip = {
+        "prefs": {"destination": destination, "mood": mood, "pax": pax, "startDate": start, "endDate": end},
+        "itineraryDraft": {"city": city, "total_budget": 20000, "days": days},
+    }
+    trip.update(extra)
+    return trip
+
+
+def _prefs(destination="Jaipur", mood=2, start="2025-01-10", end="2025-01-11", pax=2):
+    return {"destination": destination, "mood": mood, "pax": pax, "startDate": start, "endDate": end}
+
+
+def test_find_matches_requested_and_resolved_destination():
+    index = TripIndex()
+    index.add("t1", _trip())
+    assert index.find(_prefs(destination="JAI"))["tripId"] == "t1"
+    assert index.find(_prefs(destination="jaipur, Rajasthan"))["tripId"] == "t1"
+    assert index.find(_prefs(destination="Goa")) is None
+
+
+def test_find_prefers_closer_mood_then_newer_trip():
+    index = TripIndex()
+    index.add("old-exact", _trip(mood=3))
+    index.add("near", _trip(mood=2))
+    index.add("new-exact", _trip(mood=3))
+    assert index.find(_prefs(mood=3))["tripId"] == "new-exact"
+
+
+def test_find_rejects_trips_too_far_in_mood():
+    index = TripIndex(max_mood_distance=1)
+    index.add("balanced", _trip(mood=2))
+    assert index.find(_prefs(mood=4)) is None
+    assert index.find(_prefs(mood=3))["tripId"] == "balanced"
+
+
+def test_find_rejects_shorter_or_much_longer_trips():
+    index = TripIndex(max_extra_days=1)
+    index.add("two-day", _trip())
+    # A 7-day request must not be padded out from a 2-day trip
+    assert index.find(_prefs(end="2025-01-16")) is None
+    assert index.find(_prefs(end="2025-01-10"))["tripId"] == "two-day"
+
+    index = TripIndex(max_extra_days=0)
+    index.add("two-day", _trip())
+    assert index.find(_prefs(end="2025-01-10")) is None
+
+
+def test_preview_redates_trims_and_scales_without_repeating_days():
+    index = TripIndex()
+    index.add("t1", _trip())
+    draft = index.preview(_prefs(end="2025-01-10", pax=4))
+    assert [d["date"] for d in draft["days"]] == ["2025-01-10"]
+    assert [b["title"] for b in draft["days"][0]["blocks"]] == ["City Palace", "Amber Fort"]
+    assert draft["total_budget"] == 20000 * 2 * 0.5
+    assert draft["similarTo"] == "t1"
+
+
+def test_preview_does_not_mutate_indexed_trip():
+    index = TripIndex()
+    index.add("t1", _trip())
+    index.preview(_prefs(end="2025-01-10"))["days"][0]["blocks"].clear()
+    assert len(index.preview(_prefs())["days"]) == 2
+    assert index.preview(_prefs())["days"][0]["blocks"]
+
+
+def test_rebuild_skips_fallbacks_copies_and_legacy_generic_trips():
+    index = TripIndex()
+    count = index.rebuild(
+        [
+            ("gemini", _trip(source="gemini")),
+            ("fallback", _trip(source="fallback", mood=3)),
+            ("similar", _trip(source="similar", mood=3)),
+            # Saved before `source` existed: generic fallback blocks give it away
+            ("legacy-fallback", _trip(mood=3, titles=[["Jaipur Highlights Walk", "Local Lunch Spot"], ["x"]])),
+            ("legacy-real", _trip(mood=1)),
+        ]
+    )
+    assert count == 2
+    assert index.find(_prefs(mood=3))["tripId"] == "gemini"
+    assert index.find(_prefs(mood=1))["tripId"] == "legacy-real"
+
+
+def test_rebuild_from_jsonl_export(tmp_path):
+    path = tmp_path / "trips.jsonl"
+    docs = [dict(_trip(), __name__="projects/p/databases/(default)/documents/trip/abc")]
+    path.write_text("\n".join(json.dumps(d) for d in docs) + "\n")
+    index = TripIndex()
+    assert index.rebuild_from_export(str(path)) == 1
+    assert index.find(_prefs())["tripId"] == "abc"